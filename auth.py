@@ -15,6 +15,16 @@ def get_user_by_email(email: str) -> Optional[dict]:
     return None
 
 
+def get_user_by_id(user_id: str) -> Optional[dict]:
+    """Get user from Firestore by document id"""
+    snap = db.collection(USERS_COLLECTION).document(user_id).get()
+    if not snap.exists:
+        return None
+    user = snap.to_dict()
+    user["id"] = snap.id
+    return user
+
+
 def create_user(email: str, password: str, role: str = "student") -> dict:
     """Create new user in Firestore"""
     doc_ref = db.collection(USERS_COLLECTION).document()
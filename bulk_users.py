@@ -0,0 +1,494 @@
+# bulk_users.py
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from logging_config import setup_logging
+from auth import USERS_COLLECTION
+from firestore_setup import db
+
+setup_logging()
+logger = logging.getLogger("bulk_users")
+
+# Same collections the agent modules use; repeated here so the CLI does not
+# have to configure Gemini just to move data around.
+STUDENTS_COLLECTION = "student_profiles"
+VOLUNTEERS_COLLECTION = "volunteers"
+
+VALID_ROLES = ["student", "volunteer"]
+VALID_STATUSES = ["available", "busy", "offline"]
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# Firestore allows 500 writes per batch and each record writes a user and a profile
+MAX_BATCH_WRITES = 500
+WRITES_PER_RECORD = 2
+DEFAULT_CHUNK_SIZE = MAX_BATCH_WRITES // WRITES_PER_RECORD
+DEFAULT_WORKERS = 8
+CHECKPOINT_EVERY_SECONDS = 2.0
+
+CSV_FIELDS = ["id", "email", "password", "role", "weak_topics", "status", "topics", "availability"]
+USER_FIELDS = ["id", "email", "password", "role"]
+# Profile fields a fresh import resets and a JSONL backup restore brings back
+RESTORE_FIELDS = {
+    "student": ["history"],
+    "volunteer": ["students_assigned", "sessions_completed", "total_hours", "rating"],
+}
+
+
+# ============================================
+# INPUT PARSING & VALIDATION
+# ============================================
+def _split_list(value: Any) -> List[str]:
+    """CSV cells hold lists as 'a;b;c', JSONL holds real lists"""
+    if value is None or value == "":
+        return []
+    if isinstance(value, list):
+        if not all(isinstance(v, str) for v in value):
+            raise ValueError(f"list items must be strings: {value!r}")
+        return [v.strip() for v in value if v.strip()]
+    if not isinstance(value, str):
+        raise ValueError(f"expected a list or ';'-separated string: {value!r}")
+    return [v.strip() for v in value.split(";") if v.strip()]
+
+
+def _parse_availability(value: Any) -> Dict[str, Dict[str, str]]:
+    """Accept {'Monday': {'start': .., 'end': ..}} or 'Monday=09:00-12:00;Tuesday=..'"""
+    if value is None or value == "":
+        return {}
+    if isinstance(value, dict):
+        return {day: {"start": str(slot["start"]), "end": str(slot["end"])} for day, slot in value.items()}
+
+    availability = {}
+    for item in _split_list(value):
+        day, _, span = item.partition("=")
+        start, _, end = span.partition("-")
+        if not day or not start or not end:
+            raise ValueError(f"bad availability entry: {item}")
+        availability[day.strip()] = {"start": start.strip(), "end": end.strip()}
+    return availability
+
+
+def _format_availability(availability: Dict[str, Dict[str, str]]) -> str:
+    return ";".join(f"{day}={slot['start']}-{slot['end']}" for day, slot in availability.items())
+
+
+def read_records(path: str) -> Iterator[Any]:
+    """Stream raw records from a .csv or .jsonl file one at a time
+
+    JSONL lines are yielded unparsed so that one malformed line is rejected
+    by validate_record instead of aborting the whole import.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield line
+
+
+def _restored_fields(raw: Dict[str, Any], record: Dict[str, Any]) -> Dict[str, Any]:
+    """The RESTORE_FIELDS for the record's role, validated; other keys are ignored"""
+    restored = {k: raw[k] for k in RESTORE_FIELDS[record["role"]] if k in raw}
+
+    if record["role"] == "student":
+        history = restored.get("history", [])
+        if not isinstance(history, list) or not all(isinstance(h, dict) for h in history):
+            raise ValueError("history must be a list of objects")
+    else:
+        assigned = restored.get("students_assigned", [])
+        if not isinstance(assigned, list) or not all(isinstance(s, str) for s in assigned):
+            raise ValueError("students_assigned must be a list of ids")
+        for field, cast in (("sessions_completed", int), ("total_hours", float), ("rating", float)):
+            if field in restored:
+                if isinstance(restored[field], bool) or not isinstance(restored[field], (int, float)):
+                    raise ValueError(f"{field} must be a number")
+                restored[field] = cast(restored[field])
+    return restored
+
+
+def validate_record(raw: Any, restore: bool = False) -> Dict[str, Any]:
+    """Normalise one input record; raises ValueError if it cannot be imported
+
+    With restore=True the record is read as a line of a JSONL backup: its id
+    is required, and the RESTORE_FIELDS for its role (history,
+    sessions_completed, ...) are carried over instead of being reset.
+    """
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"invalid JSON: {e}")
+    if not isinstance(raw, dict):
+        raise ValueError(f"record must be an object, got {type(raw).__name__}")
+
+    email = str(raw.get("email") or "").strip()
+    password = str(raw.get("password") or "")
+    role = str(raw.get("role") or "student").strip().lower()
+
+    if "@" not in email:
+        raise ValueError(f"invalid email: {email!r}")
+    if not password:
+        raise ValueError("missing password")
+    if role not in VALID_ROLES:
+        raise ValueError(f"invalid role: {role}")
+
+    record = {
+        "id": str(raw.get("id") or "").strip() or None,
+        "email": email,
+        "password": password,
+        "role": role,
+    }
+
+    if role == "student":
+        record["weak_topics"] = _split_list(raw.get("weak_topics"))
+    else:
+        status = str(raw.get("status") or "offline").strip().lower()
+        if status not in VALID_STATUSES:
+            raise ValueError(f"invalid status: {status}")
+        availability = _parse_availability(raw.get("availability"))
+        for day in availability:
+            if day not in DAYS:
+                raise ValueError(f"invalid day: {day}")
+        record["status"] = status
+        record["topics"] = _split_list(raw.get("topics"))
+        record["availability"] = availability
+
+    if restore:
+        if not record["id"]:
+            raise ValueError("restore needs the exported id")
+        record["restored"] = _restored_fields(raw, record)
+
+    return record
+
+
+def load_existing_users() -> Tuple[set, set]:
+    """Fetch every registered email and user id in one streamed query (email field only)"""
+    emails, ids = set(), set()
+    for d in db.collection(USERS_COLLECTION).select(["email"]).stream():
+        emails.add(str(d.to_dict().get("email", "")).lower())
+        ids.add(d.id)
+    return emails, ids
+
+
+def _profile_for(record: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """Build the profile document as load_*_profile would create it, plus any restored fields"""
+    if record["role"] == "student":
+        collection, profile = STUDENTS_COLLECTION, {
+            "weak_topics": record["weak_topics"],
+            "history": [],
+        }
+    else:
+        collection, profile = VOLUNTEERS_COLLECTION, {
+            "status": record["status"],
+            "topics": record["topics"],
+            "availability": record["availability"],
+            "students_assigned": [],
+            "sessions_completed": 0,
+            "total_hours": 0.0,
+            "rating": 0.0,
+        }
+    profile.update(record.get("restored", {}))
+    return collection, profile
+
+
+def commit_chunk(records: List[Dict[str, Any]]) -> int:
+    """Write users and their profiles in a single atomic batch
+
+    User documents are created rather than set, so if an id was taken after
+    the import started the whole batch fails instead of overwriting a user.
+    """
+    batch = db.batch()
+    for record in records:
+        user_ref = (
+            db.collection(USERS_COLLECTION).document(record["id"])
+            if record["id"]
+            else db.collection(USERS_COLLECTION).document()
+        )
+        batch.create(user_ref, {
+            "email": record["email"],
+            "password": record["password"],
+            "role": record["role"],
+        })
+        profile_collection, profile = _profile_for(record)
+        batch.set(db.collection(profile_collection).document(user_ref.id), profile)
+    batch.commit()
+    return len(records)
+
+
+# ============================================
+# CHECKPOINTS
+# ============================================
+def load_checkpoint(path: Optional[str], input_path: str) -> int:
+    """Return how many input records a previous run already handled"""
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path, encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("input") != os.path.abspath(input_path):
+        raise ValueError(f"checkpoint {path} belongs to {checkpoint.get('input')}")
+    return int(checkpoint.get("records_done", 0))
+
+
+def save_checkpoint(path: Optional[str], input_path: str, records_done: int) -> None:
+    if not path:
+        return
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"input": os.path.abspath(input_path), "records_done": records_done}, f)
+    os.replace(tmp_path, path)
+
+
+# ============================================
+# IMPORT
+# ============================================
+def import_users(
+    input_path: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    workers: int = DEFAULT_WORKERS,
+    checkpoint_path: Optional[str] = None,
+    dry_run: bool = False,
+    restore: bool = False,
+) -> Dict[str, int]:
+    """Stream, validate, de-duplicate and batch-write users from CSV/JSONL
+
+    Pass restore=True to load a JSONL backup written by export_users with
+    include_passwords=True (see validate_record).
+
+    Chunks are committed in parallel with at most 2 * workers chunks in
+    memory. The checkpoint only advances past chunks whose predecessors have
+    also committed, so a resumed run never skips an unwritten record; any
+    later chunk that did land before the crash is caught by the email and id
+    de-duplication on the next run. A chunk whose commit fails is logged and
+    counted under "failed", the import carries on, and the checkpoint stays
+    before that chunk so a resumed run retries it.
+    """
+    if chunk_size < 1 or chunk_size > DEFAULT_CHUNK_SIZE:
+        raise ValueError(f"chunk_size must be between 1 and {DEFAULT_CHUNK_SIZE}")
+    if restore and not input_path.endswith(".jsonl"):
+        raise ValueError("restore needs a .jsonl export; CSV exports do not carry history or stats")
+    if dry_run:
+        # A dry run must not mark records as done for the real import
+        checkpoint_path = None
+
+    resume_from = load_checkpoint(checkpoint_path, input_path)
+    if resume_from:
+        logger.info(f"Resuming {input_path} after {resume_from} records")
+
+    existing_emails, existing_ids = load_existing_users()
+    logger.info(f"Loaded {len(existing_emails)} existing users")
+
+    stats = {"read": 0, "imported": 0, "invalid": 0, "duplicate": 0, "failed": 0, "skipped": resume_from}
+    pending = {}        # future -> (chunk number, input position after the chunk, record count)
+    finished = {}       # chunk number -> input position, committed but not yet contiguous
+    next_to_checkpoint = 0
+    records_done = resume_from
+    last_checkpoint = time.monotonic()
+
+    def drain(block_until: int) -> None:
+        nonlocal next_to_checkpoint, records_done, last_checkpoint
+        while len(pending) > block_until:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                chunk_no, position, size = pending.pop(future)
+                try:
+                    stats["imported"] += future.result()
+                except Exception as e:
+                    # Leave the chunk out of `finished` so the checkpoint stops before it
+                    stats["failed"] += size
+                    logger.error(f"Chunk {chunk_no} ({size} records before input position {position}) failed: {e}")
+                    continue
+                finished[chunk_no] = position
+        while next_to_checkpoint in finished:
+            records_done = finished.pop(next_to_checkpoint)
+            next_to_checkpoint += 1
+        if time.monotonic() - last_checkpoint >= CHECKPOINT_EVERY_SECONDS:
+            save_checkpoint(checkpoint_path, input_path, records_done)
+            last_checkpoint = time.monotonic()
+
+    chunk: List[Dict[str, Any]] = []
+    chunk_no = 0
+    position = resume_from
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        def submit() -> None:
+            nonlocal chunk, chunk_no
+            if dry_run:
+                stats["imported"] += len(chunk)
+                finished[chunk_no] = position
+            else:
+                pending[executor.submit(commit_chunk, chunk)] = (chunk_no, position, len(chunk))
+            chunk = []
+            chunk_no += 1
+            drain(block_until=2 * workers - 1)
+
+        for raw in islice(read_records(input_path), resume_from, None):
+            position += 1
+            stats["read"] += 1
+            try:
+                record = validate_record(raw, restore=restore)
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                stats["invalid"] += 1
+                logger.warning(f"Skipping record {position}: {e}")
+                continue
+
+            email_key = record["email"].lower()
+            if email_key in existing_emails or record["id"] in existing_ids:
+                stats["duplicate"] += 1
+                continue
+            existing_emails.add(email_key)
+            if record["id"]:
+                existing_ids.add(record["id"])
+
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                submit()
+
+        if chunk:
+            submit()
+        drain(block_until=0)
+
+    if not stats["failed"]:
+        # Every chunk has committed, so trailing invalid/duplicate records count as done too
+        records_done = position
+    save_checkpoint(checkpoint_path, input_path, records_done)
+    logger.info(f"Import finished: {stats}")
+    return stats
+
+
+# ============================================
+# EXPORT
+# ============================================
+def _chunks(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_users_with_profiles(chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """Stream users joined with their profiles, fetching profiles in batched reads"""
+    users = db.collection(USERS_COLLECTION).stream()
+    for chunk in _chunks(users, chunk_size):
+        rows = []
+        refs = []
+        for doc in chunk:
+            user = doc.to_dict()
+            user["id"] = doc.id
+            collection = STUDENTS_COLLECTION if user.get("role") == "student" else VOLUNTEERS_COLLECTION
+            rows.append(user)
+            refs.append(db.collection(collection).document(doc.id))
+
+        profiles = {}
+        for snap in db.get_all(refs):
+            if snap.exists:
+                profiles[snap.id] = snap.to_dict()
+
+        for user in rows:
+            user["profile"] = profiles.get(user["id"], {})
+            yield user
+
+
+def export_users(
+    output_path: str,
+    include_passwords: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> int:
+    """Write every user and profile to .csv (import format) or .jsonl (full profile)
+
+    Only a .jsonl export with include_passwords=True is a backup: it can be
+    loaded back with import_users(..., restore=True). CSV exports drop
+    history and volunteer stats, and exports without passwords cannot be
+    imported at all, so treat both as analytics exports. Sessions are not
+    exported.
+    """
+    count = 0
+    with open(output_path, "w", newline="", encoding="utf-8") as f:
+        writer = None
+        if output_path.endswith(".csv"):
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+
+        for user in iter_users_with_profiles(chunk_size):
+            profile = user.pop("profile")
+            if not include_passwords:
+                user.pop("password", None)
+
+            if writer is not None:
+                writer.writerow({
+                    "id": user["id"],
+                    "email": user.get("email", ""),
+                    "password": user.get("password", ""),
+                    "role": user.get("role", ""),
+                    "weak_topics": ";".join(profile.get("weak_topics", [])),
+                    "status": profile.get("status", ""),
+                    "topics": ";".join(profile.get("topics", [])),
+                    "availability": _format_availability(profile.get("availability", {})),
+                })
+            else:
+                user.update(profile)
+                f.write(json.dumps(user, default=str) + "\n")
+            count += 1
+
+    logger.info(f"Exported {count} users to {output_path}")
+    return count
+
+
+# ============================================
+# CLI
+# ============================================
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import/export GHF users and profiles")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    p_import = subparsers.add_parser("import", help="import users from .csv or .jsonl")
+    p_import.add_argument("input")
+    p_import.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    p_import.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    p_import.add_argument("--checkpoint", help="checkpoint file for resuming an interrupted import")
+    p_import.add_argument("--dry-run", action="store_true", help="validate and de-duplicate without writing")
+    p_import.add_argument(
+        "--restore",
+        action="store_true",
+        help="input is a .jsonl backup from 'export --include-passwords'; keep ids, history and stats",
+    )
+
+    p_export = subparsers.add_parser("export", help="export users to .csv or .jsonl")
+    p_export.add_argument("output")
+    p_export.add_argument(
+        "--include-passwords",
+        action="store_true",
+        help="required for a restorable .jsonl backup; omit for analytics exports",
+    )
+    p_export.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+
+    args = parser.parse_args()
+
+    if args.command == "import":
+        if args.restore and not args.input.endswith(".jsonl"):
+            parser.error("--restore needs a .jsonl export made with 'export --include-passwords'")
+        stats = import_users(
+            args.input,
+            chunk_size=args.chunk_size,
+            workers=args.workers,
+            checkpoint_path=args.checkpoint,
+            dry_run=args.dry_run,
+            restore=args.restore,
+        )
+        print(json.dumps(stats, indent=2))
+        sys.exit(1 if stats["invalid"] or stats["failed"] else 0)
+    else:
+        export_users(args.output, include_passwords=args.include_passwords, chunk_size=args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+# rerun_profiler.py
+import argparse
+import cProfile
+import copy
+import json
+import logging
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+import types
+import uuid
+from contextlib import contextmanager
+from importlib import import_module
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from streamlit.runtime.scriptrunner.script_runner import ScriptRunner
+from streamlit.testing.v1 import AppTest
+
+from logging_config import setup_logging
+
+setup_logging()
+logger = logging.getLogger("rerun_profiler")
+
+APP_SCRIPT = "streamlit_app.py"
+DEFAULT_BUDGETS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rerun_budgets.json")
+DEFAULT_OUTPUT_DIR = "rerun_profiles"
+METRICS = ["wall_ms", "cpu_ms", "peak_kb", "db_reads", "db_writes", "llm_calls"]
+
+STUDENT = {"id": "student-1", "email": "student@ghf.org", "password": "pw", "role": "student"}
+VOLUNTEER = {"id": "volunteer-1", "email": "volunteer@ghf.org", "password": "pw", "role": "volunteer"}
+
+
+# ============================================
+# LOCAL BACKEND FAKES
+# ============================================
+class FakeSnapshot:
+    def __init__(self, doc_id: str, data: Optional[dict]):
+        self.id = doc_id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self) -> dict:
+        return copy.deepcopy(self._data)
+
+
+class FakeDocument:
+    def __init__(self, db: "FakeFirestore", collection: str, doc_id: str):
+        self._db = db
+        self._collection = collection
+        self.id = doc_id
+
+    def get(self) -> FakeSnapshot:
+        self._db.reads += 1
+        return FakeSnapshot(self.id, self._db.store.get(self._collection, {}).get(self.id))
+
+    def set(self, data: dict) -> None:
+        self._db.writes += 1
+        self._db.store.setdefault(self._collection, {})[self.id] = copy.deepcopy(data)
+
+
+class FakeQuery:
+    def __init__(self, db: "FakeFirestore", collection: str, filters=None, limit_to=None):
+        self._db = db
+        self._collection = collection
+        self._filters = filters or []
+        self._limit = limit_to
+
+    def where(self, field: str, op: str, value: Any) -> "FakeQuery":
+        return FakeQuery(self._db, self._collection, self._filters + [(field, op, value)], self._limit)
+
+    def limit(self, count: int) -> "FakeQuery":
+        return FakeQuery(self._db, self._collection, self._filters, count)
+
+    def _matches(self, data: dict) -> bool:
+        for field, op, value in self._filters:
+            if op == "==" and data.get(field) != value:
+                return False
+            if op == "array-contains" and value not in data.get(field, []):
+                return False
+        return True
+
+    def stream(self):
+        # One query is one round-trip, however many documents it returns
+        self._db.reads += 1
+        docs = self._db.store.get(self._collection, {})
+        results = [FakeSnapshot(i, d) for i, d in docs.items() if self._matches(d)]
+        return iter(results[:self._limit] if self._limit else results)
+
+
+class FakeCollection(FakeQuery):
+    def document(self, doc_id: Optional[str] = None) -> FakeDocument:
+        return FakeDocument(self._db, self._collection, doc_id or uuid.uuid4().hex)
+
+
+class FakeFirestore:
+    """In-memory stand-in for the Firestore client that counts round-trips"""
+
+    def __init__(self):
+        self.store: Dict[str, Dict[str, dict]] = {}
+        self.reads = 0
+        self.writes = 0
+
+    def collection(self, name: str) -> FakeCollection:
+        return FakeCollection(self, name)
+
+    def reset(self, seed: Dict[str, Dict[str, dict]]) -> None:
+        self.store = copy.deepcopy(seed)
+        self.reads = 0
+        self.writes = 0
+
+
+class FakeGenerativeModel:
+    calls = 0
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    def generate_content(self, prompt: str):
+        FakeGenerativeModel.calls += 1
+        return types.SimpleNamespace(text="Here is a step by step explanation.")
+
+
+def install_fakes() -> FakeFirestore:
+    """Swap firestore_setup and google.generativeai for local fakes before the app imports them"""
+    db = FakeFirestore()
+
+    firestore_setup = types.ModuleType("firestore_setup")
+    firestore_setup.db = db
+    firestore_setup.get_db = lambda: db
+    sys.modules["firestore_setup"] = firestore_setup
+
+    genai = types.ModuleType("google.generativeai")
+    genai.configure = lambda **kwargs: None
+    genai.GenerativeModel = FakeGenerativeModel
+    try:
+        # Keep the real namespace package; protobuf lives under it too
+        google = import_module("google")
+    except ImportError:
+        google = types.ModuleType("google")
+        google.__path__ = []
+        sys.modules["google"] = google
+    google.generativeai = genai
+    sys.modules["google.generativeai"] = genai
+
+    # Make sure the app's backend modules bind to the fakes on their next import
+    for name in ("auth", "student_agent_firestore", "volunteer_agent_firestore"):
+        sys.modules.pop(name, None)
+    return db
+
+
+def default_seed() -> Dict[str, Dict[str, dict]]:
+    return {
+        "users": {
+            u["id"]: {k: v for k, v in u.items() if k != "id"} for u in (STUDENT, VOLUNTEER)
+        },
+        "student_profiles": {
+            STUDENT["id"]: {
+                "email": STUDENT["email"],
+                "weak_topics": ["DSA"],
+                "history": [{"role": "student", "message": "What is a heap?"}],
+            },
+        },
+        "volunteers": {
+            VOLUNTEER["id"]: {
+                "status": "available",
+                "topics": ["DSA", "OS"],
+                "availability": {"Monday": {"start": "09:00:00", "end": "11:00:00"}},
+                "students_assigned": [STUDENT["id"]],
+                "sessions_completed": 2,
+                "total_hours": 2.0,
+                "rating": 4.5,
+            },
+        },
+        "sessions": {
+            "session-1": {
+                "volunteer_id": VOLUNTEER["id"],
+                "student_id": STUDENT["id"],
+                "topic": "DSA",
+                "scheduled_time": "2026-01-05 10:00",
+                "status": "scheduled",
+                "duration": 0,
+                "notes": "",
+            },
+        },
+    }
+
+
+# ============================================
+# SCENARIOS
+# ============================================
+def _button(at, label: str):
+    return next(b for b in at.button if b.label == label)
+
+
+def _login(at):
+    at.text_input(key="login_email").input(STUDENT["email"])
+    at.text_input(key="login_password").input(STUDENT["password"])
+    _button(at, "Login").click().run()
+
+
+def _ask_mentor(at):
+    at.text_area[0].input("Explain linked lists")
+    at.button(key="ask_mentor_btn").click().run()
+
+
+def _update_status(at):
+    _button(at, "Update Status").click().run()
+
+
+def _save_monday(at):
+    at.button(key="save_Monday").click().run()
+
+
+def _rerun(at):
+    at.run()
+
+
+# name -> (logged-in user, [(step name, action)]); the first step is the initial render
+SCENARIOS: Dict[str, Tuple[Optional[dict], List[Tuple[str, Callable]]]] = {
+    "login": (None, [
+        ("render", _rerun),
+        ("login", _login),
+    ]),
+    "student_dashboard": (STUDENT, [
+        ("render", _rerun),
+        ("rerun", _rerun),
+        ("ask_mentor", _ask_mentor),
+    ]),
+    "volunteer_dashboard": (VOLUNTEER, [
+        ("render", _rerun),
+        ("rerun", _rerun),
+        ("update_status", _update_status),
+        ("save_availability", _save_monday),
+    ]),
+}
+
+
+def _new_app(user: Optional[dict]):
+    at = AppTest.from_file(APP_SCRIPT, default_timeout=30)
+    at.secrets["GEMINI_API_KEY"] = "fake-key"
+    if user is not None:
+        at.session_state["user"] = dict(user)
+    return at
+
+
+def warm_up(db: FakeFirestore) -> None:
+    """Render every page once, untimed, so one-time import costs are not charged to a scenario
+
+    Without this the first scenario measured pays for importing the app and
+    backend modules, and budgets would depend on which scenarios are run.
+    """
+    for user in {id(u): u for u, _ in SCENARIOS.values()}.values():
+        db.reset(default_seed())
+        at = _new_app(user)
+        at.run()
+        if at.exception:
+            raise RuntimeError(f"warm-up render raised: {at.exception[0].value}")
+
+
+@contextmanager
+def profile_script_thread(profiler: cProfile.Profile):
+    """Profile every script run started while active
+
+    AppTest executes the page on a ScriptRunner thread, and cProfile only
+    sees the thread that enabled it, so the profiler is switched on inside
+    ScriptRunner._run_script rather than around the AppTest call.
+    """
+    original = ScriptRunner._run_script
+
+    def _run_script(runner, rerun_data):
+        profiler.enable()
+        try:
+            return original(runner, rerun_data)
+        finally:
+            profiler.disable()
+
+    ScriptRunner._run_script = _run_script
+    try:
+        yield profiler
+    finally:
+        ScriptRunner._run_script = original
+
+
+def _check_profiled_app(profiler: cProfile.Profile, key: str) -> None:
+    """Fail loudly if the profile does not cover the app script itself"""
+    stats = pstats.Stats(profiler).stats
+    if not any(
+        filename.endswith(APP_SCRIPT) and funcname == "main"
+        for filename, _, funcname in stats
+    ):
+        raise RuntimeError(f"{key}: CPU profile does not contain {APP_SCRIPT}:main")
+
+
+def run_scenario(name: str, db: FakeFirestore, output_dir: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+    """Run one page through its steps and measure every rerun
+
+    Call warm_up first. Wall time is measured with cProfile and tracemalloc
+    active, so compare it against earlier runs of this harness rather than
+    against production timings.
+    """
+    user, steps = SCENARIOS[name]
+    db.reset(default_seed())
+    at = _new_app(user)
+
+    results = {}
+    for step, action in steps:
+        reads, writes, llm_calls = db.reads, db.writes, FakeGenerativeModel.calls
+        profiler = cProfile.Profile()
+        tracemalloc.start()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+
+        with profile_script_thread(profiler):
+            action(at)
+
+        wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        if at.exception:
+            raise RuntimeError(f"{name}/{step} raised: {at.exception[0].value}")
+
+        key = f"{name}/{step}"
+        _check_profiled_app(profiler, key)
+        results[key] = {
+            "wall_ms": round(wall * 1000, 2),
+            "cpu_ms": round(cpu * 1000, 2),
+            "peak_kb": round(peak / 1024, 1),
+            "db_reads": db.reads - reads,
+            "db_writes": db.writes - writes,
+            "llm_calls": FakeGenerativeModel.calls - llm_calls,
+        }
+        if output_dir:
+            # Render with snakeviz, or flameprof for a flamegraph SVG
+            profiler.dump_stats(os.path.join(output_dir, f"{name}__{step}.prof"))
+
+    return results
+
+
+# ============================================
+# BUDGETS
+# ============================================
+def load_budgets(path: Optional[str]) -> Dict[str, Dict[str, float]]:
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def check_budgets(results: Dict[str, Dict[str, float]], budgets: Dict[str, Dict[str, float]]) -> List[str]:
+    """Return one message per metric that exceeds its budget
+
+    Budget keys are either "scenario/step" or "scenario/*" to cover every step.
+    """
+    violations = []
+    for key, metrics in results.items():
+        scenario = key.split("/")[0]
+        limits = dict(budgets.get(f"{scenario}/*", {}))
+        limits.update(budgets.get(key, {}))
+        for metric, limit in limits.items():
+            if metric not in metrics:
+                raise ValueError(f"unknown metric in budget for {key}: {metric}")
+            if metrics[metric] > limit:
+                violations.append(f"{key}: {metric}={metrics[metric]} exceeds budget {limit}")
+    return violations
+
+
+def print_table(results: Dict[str, Dict[str, float]]) -> None:
+    width = max(len(k) for k in results)
+    print(f"{'step':<{width}}  " + "  ".join(f"{m:>10}" for m in METRICS))
+    for key, metrics in results.items():
+        print(f"{key:<{width}}  " + "  ".join(f"{metrics[m]:>10}" for m in METRICS))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile Streamlit reruns against local backend fakes")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="default: all")
+    parser.add_argument("--budgets", default=DEFAULT_BUDGETS, help="JSON file of per-step metric limits")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR, help="where .prof files and report.json go")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    db = install_fakes()
+    warm_up(db)
+
+    results = {}
+    for name in args.scenario or list(SCENARIOS):
+        results.update(run_scenario(name, db, args.output_dir))
+
+    print_table(results)
+    violations = check_budgets(results, load_budgets(args.budgets))
+
+    with open(os.path.join(args.output_dir, "report.json"), "w", encoding="utf-8") as f:
+        json.dump({"results": results, "violations": violations}, f, indent=2)
+
+    for violation in violations:
+        print(f"BUDGET EXCEEDED: {violation}")
+    sys.exit(1 if violations else 0)
+
+
+if __name__ == "__main__":
+    main()
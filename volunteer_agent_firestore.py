@@ -1,6 +1,6 @@
 import os
 import logging
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 
 import streamlit as st
@@ -164,6 +164,16 @@ def get_scheduled_sessions(volunteer_id: str) -> List[Dict[str, Any]]:
     return sessions
 
 
+def get_session(session_id: str) -> Optional[Dict[str, Any]]:
+    """Get a single session by id"""
+    session_snap = db.collection(SESSIONS_COLLECTION).document(session_id).get()
+    if not session_snap.exists:
+        return None
+    session_data = session_snap.to_dict()
+    session_data["id"] = session_id
+    return session_data
+
+
 def complete_session(session_id: str, duration: int, notes: str = "") -> bool:
     """Mark a session as completed"""
     session_ref = db.collection(SESSIONS_COLLECTION).document(session_id)
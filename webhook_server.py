@@ -0,0 +1,460 @@
+# webhook_server.py
+import argparse
+import hashlib
+import hmac
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import urllib.request
+import zlib
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from logging_config import setup_logging
+
+setup_logging()
+logger = logging.getLogger("webhook_server")
+
+# Volunteer operations reachable over the webhook. The volunteer id is always
+# the sender's user_id; "args" in the payload supplies the remaining arguments.
+VOLUNTEER_ACTIONS = {
+    "set_availability",
+    "set_status",
+    "add_topic",
+    "remove_topics",
+    "create_session",
+    "get_assigned_students",
+    "get_scheduled_sessions",
+    "get_volunteer_stats",
+}
+# Session operations are keyed by session id rather than volunteer id
+SESSION_ACTIONS = {
+    "complete_session",
+    "cancel_session",
+}
+
+DEDUP_TTL_SECONDS = 24 * 60 * 60
+DEDUP_MAX_ENTRIES = 100_000
+MAX_BODY_BYTES = 64 * 1024
+RETRY_AFTER_SECONDS = 5
+# Transient failures are retried in the worker, before the shard moves on to
+# the next message, so one user's turns stay in order
+WORKER_MAX_ATTEMPTS = 3
+WORKER_RETRY_BACKOFF_SECONDS = 1.0
+
+# Inbound requests are signed as "sha256=<hex HMAC of the raw body>", the same
+# scheme the WhatsApp Cloud API uses for its webhooks
+SIGNATURE_HEADER = "X-Hub-Signature-256"
+SECRET_ENV_VAR = "WEBHOOK_SECRET"
+# Replies go only to this operator-configured URL, never to one named in a request
+REPLY_URL_ENV_VAR = "WEBHOOK_REPLY_URL"
+
+_STOP = None
+
+
+# Message states tracked by MessageDeduplicator
+NEW = "new"
+IN_PROGRESS = "in_progress"
+DONE = "done"
+
+
+class MessageDeduplicator:
+    """Track message ids so retried deliveries are dropped once a message is done
+
+    A message is IN_PROGRESS from the moment it is queued until its worker
+    reports back. Only then is it DONE; if processing failed the id is
+    released so the channel's next retry is accepted again.
+    """
+
+    def __init__(self, ttl: float = DEDUP_TTL_SECONDS, max_entries: int = DEDUP_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._seen: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def claim(self, message_id: str) -> str:
+        """Mark a message IN_PROGRESS and return NEW, or return the state of an earlier delivery"""
+        now = time.monotonic()
+        with self._lock:
+            # Entries are kept in insertion order, so expired ones are at the front
+            while self._seen:
+                _, (_, seen_at) = next(iter(self._seen.items()))
+                if now - seen_at < self.ttl and len(self._seen) < self.max_entries:
+                    break
+                self._seen.popitem(last=False)
+
+            if message_id in self._seen:
+                return self._seen[message_id][0]
+            self._seen[message_id] = [IN_PROGRESS, now]
+            return NEW
+
+    def complete(self, message_id: str) -> None:
+        with self._lock:
+            if message_id in self._seen:
+                self._seen[message_id][0] = DONE
+
+    def release(self, message_id: str) -> None:
+        with self._lock:
+            self._seen.pop(message_id, None)
+
+
+def sign_body(secret: str, body: bytes) -> str:
+    """Signature header value for a raw request body"""
+    digest = hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    return f"sha256={digest}"
+
+
+def verify_signature(secret: str, body: bytes, signature: Optional[str]) -> bool:
+    return bool(signature) and hmac.compare_digest(sign_body(secret, body), signature)
+
+
+def handle_message(payload: Dict[str, Any]) -> Any:
+    """Run a webhook message through the student agent or a volunteer operation
+
+    The sender's role comes from their stored user record, never from the
+    payload, and session actions only run on the sender's own sessions.
+    """
+    from auth import get_user_by_id
+
+    user_id = payload["user_id"]
+    user = get_user_by_id(user_id)
+    if user is None:
+        raise PermissionError(f"unknown user: {user_id}")
+    role = user.get("role")
+
+    if role == "student":
+        if "action" in payload:
+            raise PermissionError(f"students cannot run volunteer actions: {user_id}")
+        from student_agent_firestore import student_agent
+        return student_agent(user_id=user_id, message=payload["text"])
+
+    if role != "volunteer":
+        raise PermissionError(f"unsupported role {role!r} for user {user_id}")
+    if "action" not in payload:
+        raise ValueError("volunteer messages must name an action")
+
+    import volunteer_agent_firestore
+
+    action = payload["action"]
+    args = payload.get("args", {})
+    if action in SESSION_ACTIONS:
+        session_id = args.get("session_id")
+        session = (
+            volunteer_agent_firestore.get_session(session_id)
+            if isinstance(session_id, str) and session_id
+            else None
+        )
+        if session is None or session.get("volunteer_id") != user_id:
+            raise PermissionError(f"session {session_id} does not belong to {user_id}")
+        return getattr(volunteer_agent_firestore, action)(**args)
+    return getattr(volunteer_agent_firestore, action)(user_id, **args)
+
+
+def deliver_reply(reply_url: str, body: Dict[str, Any]) -> None:
+    """POST a processed reply to the channel's configured reply URL"""
+    data = json.dumps(body, default=str).encode("utf-8")
+    request = urllib.request.Request(
+        reply_url,
+        data=data,
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        response.read()
+
+
+def _worker_loop(
+    inbox,
+    outcomes,
+    handler: Callable[[Dict[str, Any]], Any],
+    on_result: Optional[Callable[[Dict[str, Any], Any, Optional[str]], None]] = None,
+    reply_url: Optional[str] = None,
+    max_attempts: int = WORKER_MAX_ATTEMPTS,
+    retry_backoff: float = WORKER_RETRY_BACKOFF_SECONDS,
+) -> None:
+    """Process one shard's messages strictly in arrival order
+
+    A transiently failing message is retried here with exponential backoff
+    while the rest of the shard waits. Only once every attempt has failed is
+    its id released for the channel to redeliver; that redelivery can land
+    behind the user's later messages.
+    """
+    while True:
+        payload = inbox.get()
+        if payload is _STOP:
+            return
+
+        for attempt in range(1, max_attempts + 1):
+            result, error, retryable = None, None, False
+            try:
+                result = handler(payload)
+                break
+            except (PermissionError, ValueError, TypeError) as e:
+                # The message itself is bad, so a retry would fail the same way
+                error = str(e)
+                logger.warning(f"Rejected message | message_id={payload['message_id']} | {error}")
+                break
+            except Exception as e:
+                error, retryable = str(e), True
+                if attempt == max_attempts:
+                    logger.exception(f"Failed message | message_id={payload['message_id']}")
+                else:
+                    logger.warning(
+                        f"Retrying message | message_id={payload['message_id']} | "
+                        f"attempt={attempt} | {error}"
+                    )
+                    time.sleep(retry_backoff * 2 ** (attempt - 1))
+        outcomes.put((payload["message_id"], retryable))
+
+        if on_result is not None:
+            on_result(payload, result, error)
+
+        if reply_url:
+            try:
+                deliver_reply(reply_url, {
+                    "message_id": payload["message_id"],
+                    "user_id": payload["user_id"],
+                    "reply": result,
+                    "error": error,
+                })
+            except Exception:
+                logger.exception(f"Reply delivery failed | message_id={payload['message_id']}")
+
+        logger.info(
+            f"Processed message | message_id={payload['message_id']} | "
+            f"user_id={payload['user_id']} | ok={error is None}"
+        )
+
+
+def validate_payload(payload: Any) -> Optional[str]:
+    """Return an error string for malformed payloads, None if valid"""
+    if not isinstance(payload, dict):
+        return "payload must be a JSON object"
+    for field in ("message_id", "user_id"):
+        if not isinstance(payload.get(field), str) or not payload[field]:
+            return f"missing {field}"
+
+    # Student messages carry text, volunteer operations carry an action;
+    # which one the sender may use is checked against their user record later
+    if "action" in payload:
+        action = payload["action"]
+        if action not in VOLUNTEER_ACTIONS and action not in SESSION_ACTIONS:
+            return f"unknown action: {action}"
+        if not isinstance(payload.get("args", {}), dict):
+            return "args must be an object"
+    elif not isinstance(payload.get("text"), str) or not payload["text"].strip():
+        return "missing text"
+    return None
+
+
+class WebhookDispatcher:
+    """Acknowledge inbound messages immediately and process them on sharded workers
+
+    Every user is pinned to one shard, and each shard handles its messages one
+    at a time, so replies for a single user are produced in delivery order
+    while different users are processed in parallel.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Dict[str, Any]], Any] = handle_message,
+        workers: int = 4,
+        use_processes: bool = True,
+        on_result: Optional[Callable[[Dict[str, Any], Any, Optional[str]], None]] = None,
+        deduplicator: Optional[MessageDeduplicator] = None,
+        reply_url: Optional[str] = None,
+        max_attempts: int = WORKER_MAX_ATTEMPTS,
+        retry_backoff: float = WORKER_RETRY_BACKOFF_SECONDS,
+    ):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.handler = handler
+        self.workers = workers
+        self.use_processes = use_processes
+        self.on_result = on_result
+        self.deduplicator = deduplicator or MessageDeduplicator()
+        self.reply_url = reply_url
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self._inboxes = []
+        self._runners = []
+        self._outcomes = None
+        self._collector = None
+
+    def start(self) -> None:
+        self._outcomes = multiprocessing.Queue() if self.use_processes else queue.Queue()
+        self._collector = threading.Thread(target=self._collect_outcomes, daemon=True)
+        self._collector.start()
+
+        for _ in range(self.workers):
+            if self.use_processes:
+                inbox = multiprocessing.Queue()
+                runner = multiprocessing.Process(
+                    target=_worker_loop,
+                    args=(
+                        inbox, self._outcomes, self.handler, self.on_result,
+                        self.reply_url, self.max_attempts, self.retry_backoff,
+                    ),
+                    daemon=True,
+                )
+            else:
+                inbox = queue.Queue()
+                runner = threading.Thread(
+                    target=_worker_loop,
+                    args=(
+                        inbox, self._outcomes, self.handler, self.on_result,
+                        self.reply_url, self.max_attempts, self.retry_backoff,
+                    ),
+                    daemon=True,
+                )
+            runner.start()
+            self._inboxes.append(inbox)
+            self._runners.append(runner)
+        logger.info(
+            f"Started {self.workers} webhook workers "
+            f"({'processes' if self.use_processes else 'threads'})"
+        )
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Drain queued messages and shut the workers down"""
+        for inbox in self._inboxes:
+            inbox.put(_STOP)
+        for runner in self._runners:
+            runner.join(timeout)
+        self._outcomes.put(_STOP)
+        self._collector.join(timeout)
+        self._inboxes = []
+        self._runners = []
+
+    def _collect_outcomes(self) -> None:
+        """Apply worker results to the deduplicator, which lives in this process"""
+        while True:
+            outcome = self._outcomes.get()
+            if outcome is _STOP:
+                return
+            message_id, retryable = outcome
+            if retryable:
+                self.deduplicator.release(message_id)
+            else:
+                self.deduplicator.complete(message_id)
+
+    def shard_for(self, user_id: str) -> int:
+        # crc32 is stable across processes and restarts, unlike hash()
+        return zlib.crc32(user_id.encode("utf-8")) % self.workers
+
+    def accept(self, payload: Any) -> Tuple[int, Dict[str, Any]]:
+        """Validate, de-duplicate and enqueue a message; returns (HTTP status, body)"""
+        error = validate_payload(payload)
+        if error:
+            return 400, {"status": "rejected", "error": error}
+
+        message_id = payload["message_id"]
+        state = self.deduplicator.claim(message_id)
+        if state == DONE:
+            logger.info(f"Duplicate delivery ignored | message_id={message_id}")
+            return 200, {"status": "duplicate", "message_id": message_id}
+        if state == IN_PROGRESS:
+            # Not acknowledged yet: if this attempt fails the channel must still retry
+            return 503, {"status": "in_progress", "message_id": message_id}
+
+        self._inboxes[self.shard_for(payload["user_id"])].put(payload)
+        return 202, {"status": "accepted", "message_id": message_id}
+
+
+def make_request_handler(dispatcher: WebhookDispatcher, secret: str):
+    class WebhookRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/health":
+                self._send(200, {"status": "ok"})
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/webhook":
+                self._send(404, {"error": "not found"})
+                return
+
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > MAX_BODY_BYTES:
+                self._send(413, {"error": "payload too large"})
+                return
+            raw_body = self.rfile.read(length)
+            if not verify_signature(secret, raw_body, self.headers.get(SIGNATURE_HEADER)):
+                self._send(401, {"error": "invalid signature"})
+                return
+            try:
+                payload = json.loads(raw_body or b"null")
+            except ValueError:
+                self._send(400, {"status": "rejected", "error": "invalid JSON"})
+                return
+
+            status, body = dispatcher.accept(payload)
+            self._send(status, body)
+
+        def _send(self, status: int, body: Dict[str, Any]):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            if status == 503:
+                self.send_header("Retry-After", str(RETRY_AFTER_SECONDS))
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return WebhookRequestHandler
+
+
+def make_server(
+    dispatcher: WebhookDispatcher,
+    secret: str,
+    host: str = "0.0.0.0",
+    port: int = 8080,
+) -> ThreadingHTTPServer:
+    if not secret:
+        raise ValueError("a webhook secret is required")
+    return ThreadingHTTPServer((host, port), make_request_handler(dispatcher, secret))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless webhook entry point for the GHF agents")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=4, help="number of worker processes")
+    parser.add_argument(
+        "--secret",
+        default=os.environ.get(SECRET_ENV_VAR),
+        help=f"shared secret for {SIGNATURE_HEADER} (default: ${SECRET_ENV_VAR})",
+    )
+    parser.add_argument(
+        "--reply-url",
+        default=os.environ.get(REPLY_URL_ENV_VAR),
+        help=f"where processed replies are POSTed (default: ${REPLY_URL_ENV_VAR})",
+    )
+    args = parser.parse_args()
+    if not args.secret:
+        parser.error(f"--secret or ${SECRET_ENV_VAR} is required")
+
+    # Workers must be started before the HTTP threads exist
+    dispatcher = WebhookDispatcher(workers=args.workers, reply_url=args.reply_url)
+    dispatcher.start()
+    server = make_server(dispatcher, args.secret, args.host, args.port)
+    logger.info(f"Webhook server listening on {args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        dispatcher.stop(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
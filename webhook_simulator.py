@@ -0,0 +1,310 @@
+# webhook_simulator.py
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional
+
+from logging_config import setup_logging
+from webhook_server import SECRET_ENV_VAR, SIGNATURE_HEADER, WebhookDispatcher, make_server, sign_body
+
+setup_logging()
+logger = logging.getLogger("webhook_simulator")
+
+
+def echo_handler(payload: Dict[str, Any]) -> str:
+    """Stand-in for the LLM: sleeps a little and echoes the message back"""
+    time.sleep(random.uniform(0.001, 0.02))
+    return f"echo: {payload.get('text', payload.get('action'))}"
+
+
+class FlakyHandler:
+    """Echo handler that fails the first fail_attempts attempts at every third message, like an LLM outage"""
+
+    def __init__(self, fail_attempts: int = 1):
+        self.fail_attempts = fail_attempts
+        self.attempts = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def __call__(self, payload: Dict[str, Any]) -> str:
+        with self.lock:
+            self.attempts[payload["message_id"]] += 1
+            attempt = self.attempts[payload["message_id"]]
+        if attempt <= self.fail_attempts and payload["seq"] % 3 == 0:
+            raise RuntimeError("LLM unavailable")
+        return echo_handler(payload)
+
+
+def build_messages(users: int, per_user: int, retry_rate: float, seed: int) -> List[Dict[str, Any]]:
+    """Interleave per-user message streams and re-send some of them like a retrying channel"""
+    rng = random.Random(seed)
+    streams = {
+        f"student-{u}": [
+            {
+                "message_id": f"student-{u}-{n}",
+                "user_id": f"student-{u}",
+                "text": f"question {n}",
+                "seq": n,
+            }
+            for n in range(per_user)
+        ]
+        for u in range(users)
+    }
+
+    messages = []
+    while streams:
+        user_id = rng.choice(list(streams))
+        message = streams[user_id].pop(0)
+        if not streams[user_id]:
+            del streams[user_id]
+        messages.append(message)
+        if rng.random() < retry_rate:
+            messages.append(dict(message))
+    return messages
+
+
+def post(url: str, payload: Dict[str, Any], secret: str) -> int:
+    body = json.dumps(payload).encode("utf-8")
+    request = urllib.request.Request(
+        url,
+        data=body,
+        headers={"Content-Type": "application/json", SIGNATURE_HEADER: sign_body(secret, body)},
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def _wait_for(condition: Callable[[], bool], timeout: float = 30.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def run_failure_simulation(users: int, per_user: int, workers: int, secret: str) -> Dict[str, Any]:
+    """Check how the dispatcher recovers when processing fails
+
+    Every third message fails. First the failures stop before the worker
+    runs out of attempts: every message must then succeed exactly once, in
+    each user's send order, without any redelivery. Then the failures
+    outlast the worker's attempts: the simulator re-delivers each failed
+    message, backing off while the server answers 503 in_progress, and
+    expects it to be accepted (202) rather than dropped as a duplicate.
+    """
+    max_attempts = 3
+    messages = build_messages(users, per_user, retry_rate=0.0, seed=1)
+    failures = []
+    report = {}
+
+    for phase, fail_attempts in (("worker_retry", max_attempts - 1), ("redelivery", max_attempts)):
+        results = []
+        lock = threading.Lock()
+
+        def on_result(payload, result, error):
+            with lock:
+                results.append((payload["message_id"], payload["user_id"], payload["seq"], error))
+
+        dispatcher = WebhookDispatcher(
+            handler=FlakyHandler(fail_attempts),
+            workers=workers,
+            use_processes=False,
+            on_result=on_result,
+            max_attempts=max_attempts,
+            retry_backoff=0.001,
+        )
+        dispatcher.start()
+        server = make_server(dispatcher, secret, "127.0.0.1", 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}/webhook"
+
+        for message in messages:
+            post(url, message, secret)
+        if not _wait_for(lambda: len(results) == len(messages)):
+            failures.append(f"{phase}: first delivery attempts did not finish")
+
+        failed_ids = {message_id for message_id, _, _, error in results if error}
+        retry_statuses = defaultdict(int)
+        for message in messages:
+            if message["message_id"] not in failed_ids:
+                continue
+            status = post(url, message, secret)
+            # The failure is reported just before the id is released, so back off briefly
+            while status == 503:
+                time.sleep(0.01)
+                status = post(url, message, secret)
+            retry_statuses[status] += 1
+            if status != 202:
+                failures.append(f"{phase}: retry of failed {message['message_id']} returned {status}, expected 202")
+
+        if not _wait_for(lambda: len(results) == len(messages) + len(failed_ids)):
+            failures.append(f"{phase}: retries did not finish")
+
+        # A message that went through must still be dropped as a duplicate
+        done = next(m for m in messages if m["message_id"] not in failed_ids)
+        duplicate_status = post(url, done, secret)
+        if duplicate_status != 200:
+            failures.append(f"{phase}: duplicate of processed message returned {duplicate_status}, expected 200")
+
+        server.shutdown()
+        server.server_close()
+        dispatcher.stop(timeout=30)
+
+        succeeded = defaultdict(int)
+        order = defaultdict(list)
+        for message_id, user_id, seq, error in results:
+            if not error:
+                succeeded[message_id] += 1
+                order[user_id].append(seq)
+        for message in messages:
+            if succeeded[message["message_id"]] != 1:
+                failures.append(
+                    f"{phase}: {message['message_id']} succeeded {succeeded[message['message_id']]} times"
+                )
+
+        if phase == "worker_retry":
+            if failed_ids:
+                failures.append(f"{phase}: {len(failed_ids)} messages needed redelivery despite worker retries")
+            for user_id, seqs in order.items():
+                if seqs != sorted(seqs):
+                    failures.append(f"{phase}: {user_id} processed out of order: {seqs}")
+
+        report[phase] = {
+            "failed_after_worker_retries": len(failed_ids),
+            "retry_statuses": dict(retry_statuses),
+        }
+
+    report["failures"] = failures
+    return report
+
+
+def run_simulation(
+    users: int = 20,
+    per_user: int = 10,
+    retry_rate: float = 0.2,
+    workers: int = 4,
+    seed: int = 0,
+    url: Optional[str] = None,
+    secret: str = "simulator-secret",
+) -> Dict[str, Any]:
+    """Drive the dispatcher (in-process, or a live server at url) and check its guarantees
+
+    In-process runs use thread workers and the echo handler so results can be
+    collected and checked: every unique message is processed exactly once and
+    each user's messages are processed in the order they were sent. They also
+    run run_failure_simulation to check that failed messages can be retried.
+    """
+    messages = build_messages(users, per_user, retry_rate, seed)
+    processed = defaultdict(list)
+    lock = threading.Lock()
+
+    def on_result(payload, result, error):
+        with lock:
+            processed[payload["user_id"]].append(payload["seq"])
+
+    dispatcher = None
+    server = None
+    if url is None:
+        dispatcher = WebhookDispatcher(
+            handler=echo_handler,
+            workers=workers,
+            use_processes=False,
+            on_result=on_result,
+        )
+        dispatcher.start()
+        server = make_server(dispatcher, secret, "127.0.0.1", 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}/webhook"
+
+    # A request signed with the wrong secret must be refused before it is queued
+    forged_status = post(url, messages[0], secret + "-forged")
+
+    statuses = defaultdict(int)
+    ack_times = []
+    started = time.perf_counter()
+    for message in messages:
+        t0 = time.perf_counter()
+        statuses[post(url, message, secret)] += 1
+        ack_times.append(time.perf_counter() - t0)
+    acked = time.perf_counter() - started
+
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+        dispatcher.stop(timeout=30)
+    elapsed = time.perf_counter() - started
+
+    ack_times.sort()
+    report = {
+        "sent": len(messages),
+        "unique": users * per_user,
+        "statuses": dict(statuses),
+        "forged_status": forged_status,
+        "ack_p50_ms": round(ack_times[len(ack_times) // 2] * 1000, 2),
+        "ack_max_ms": round(ack_times[-1] * 1000, 2),
+        "ack_total_s": round(acked, 3),
+        "total_s": round(elapsed, 3),
+    }
+
+    failures = []
+    if forged_status != 401:
+        failures.append(f"forged signature returned {forged_status}, expected 401")
+    if dispatcher is not None:
+        total = sum(len(seqs) for seqs in processed.values())
+        if total != users * per_user:
+            failures.append(f"processed {total} messages, expected {users * per_user}")
+        for user_id, seqs in processed.items():
+            if seqs != list(range(per_user)):
+                failures.append(f"{user_id} processed out of order or duplicated: {seqs}")
+
+        failure_report = run_failure_simulation(users, per_user, workers, secret)
+        failures.extend(failure_report.pop("failures"))
+        report["failure_retry"] = failure_report
+    report["failures"] = failures
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local webhook simulator for the GHF webhook server")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--per-user", type=int, default=10)
+    parser.add_argument("--retry-rate", type=float, default=0.2, help="fraction of messages delivered twice")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", help="POST to a running webhook server instead of an in-process one")
+    parser.add_argument(
+        "--secret",
+        default=os.environ.get(SECRET_ENV_VAR, "simulator-secret"),
+        help=f"shared secret used to sign requests (default: ${SECRET_ENV_VAR})",
+    )
+    args = parser.parse_args()
+
+    report = run_simulation(
+        users=args.users,
+        per_user=args.per_user,
+        retry_rate=args.retry_rate,
+        workers=args.workers,
+        seed=args.seed,
+        url=args.url,
+        secret=args.secret,
+    )
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report.get("failures") else 0)
+
+
+if __name__ == "__main__":
+    main()